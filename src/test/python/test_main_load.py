@@ -0,0 +1,266 @@
+"""
+Headless load test for the main window.
+
+Drives TafelsMainWindow offscreen through practice and test sessions and checks per-answer latency and memory
+growth against budgets. It is slow and machine dependent, so it only runs when asked for:
+
+    TAFELS_LOAD=1 PYTHONPATH=src/main/python python -m pytest -q src/test/python/test_main_load.py
+
+It needs PySide2 and the generated ui module (python setup.py build_ui); without them it is skipped.
+Results are written to tafels_load_report.txt (or TAFELS_LOAD_REPORT) and repeated in the assertion messages.
+"""
+from __future__ import annotations
+
+import os
+import random
+import tracemalloc
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import List, Optional
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+from tables import Card, CardStats, CardStatsLoader, CARD_RANGE
+
+try:
+    from PySide2.QtCore import QEvent
+    from PySide2.QtWidgets import QApplication, QMessageBox
+    from main import TafelsMainWindow, GameState
+
+    HAVE_QT = True
+except ImportError:
+    HAVE_QT = False
+
+ERROR_EVERY = 7
+TIMEOUT_AFTER = 10
+
+
+class LoadConfig:
+    """ Budgets and sizes, read from TAFELS_LOAD_* environment variables when the load test actually runs. """
+    history_sizes: List[int]
+    num_answers: int
+    sample_every: int
+    answer_budget_msec: float
+    slowdown_budget: float
+    memory_budget_kb: float
+    rss_budget_kb: float
+    report_file: Path
+
+    def __init__(self):
+        # CardStats keeps one set of counters per card, so cardstate.dat stops growing once all 200 cards have an
+        # entry. The sweep therefore covers an empty file, a partially filled one and a filled one.
+        sizes = os.environ.get("TAFELS_LOAD_HISTORY_SIZES", "0,100,1000")
+        self.history_sizes = [int(s) for s in sizes.split(",") if s.strip()]
+        self.num_answers = int(os.environ.get("TAFELS_LOAD_ANSWERS", "2000"))
+        self.sample_every = int(os.environ.get("TAFELS_LOAD_SAMPLE_EVERY", "100"))
+        self.answer_budget_msec = float(os.environ.get("TAFELS_LOAD_ANSWER_BUDGET_MSEC", "50"))
+        # p95 of the last 10% of answers divided by p95 of the first 10%
+        self.slowdown_budget = float(os.environ.get("TAFELS_LOAD_SLOWDOWN_BUDGET", "3.0"))
+        self.memory_budget_kb = float(os.environ.get("TAFELS_LOAD_MEMORY_BUDGET_KB", "1024"))
+        self.rss_budget_kb = float(os.environ.get("TAFELS_LOAD_RSS_BUDGET_KB", "8192"))
+        self.report_file = Path(os.environ.get("TAFELS_LOAD_REPORT", "tafels_load_report.txt"))
+
+
+def synthetic_history(num_answers: int) -> CardStats:
+    rng = random.Random(num_answers)
+    stats = CardStats()
+    cards = list(Card.generate(CARD_RANGE))
+    for i in range(0, num_answers):
+        card = rng.choice(cards)
+        if i % ERROR_EVERY == 0:
+            stats.add_error(card)
+        else:
+            stats.add_correct_answer(card, abs(rng.gauss(3.0, 2.0)))
+    return stats
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def current_rss_kb() -> Optional[int]:
+    """ Current resident set size, only available on linux. """
+    try:
+        with open("/proc/self/statm") as handle:
+            resident_pages = int(handle.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+class MemorySample:
+    answers_given: int
+    python_kb: float
+    rss_kb: Optional[int]
+
+    def __init__(self, answers_given: int, python_kb: float, rss_kb: Optional[int]):
+        self.answers_given = answers_given
+        self.python_kb = python_kb
+        self.rss_kb = rss_kb
+
+
+class LoadRun:
+    latencies: List[float]
+    samples: List[MemorySample]
+
+    def __init__(self, window: TafelsMainWindow, config: LoadConfig, sample_memory: bool = False):
+        self.window = window
+        self.config = config
+        self.sample_memory = sample_memory
+        self.latencies = []
+        self.samples = []
+        self.answers_given = 0
+        self.test_sessions = 0
+
+    def answer(self, wrong: bool):
+        card = self.window.current_card()
+        value = card.answer() + 1 if wrong else card.answer()
+        self.window.answer.setText(str(int(value)))
+        start = perf_counter()
+        self.window.check_answer()
+        self.latencies.append(perf_counter() - start)
+        self.answers_given += 1
+        # sampled while the window is alive, so objects that pile up on it during the session are counted
+        if self.sample_memory and self.answers_given % self.config.sample_every == 0:
+            python_bytes, _ = tracemalloc.get_traced_memory()
+            self.samples.append(MemorySample(self.answers_given, python_bytes / 1024, current_rss_kb()))
+
+    def next_is_wrong(self) -> bool:
+        return self.answers_given % ERROR_EVERY == ERROR_EVERY - 1
+
+    def done(self) -> bool:
+        return self.answers_given >= self.config.num_answers
+
+    def practice_session(self):
+        self.window.start_practice()
+        while self.window.state == GameState.PRACTICE and not self.done():
+            self.answer(self.next_is_wrong())
+        if self.window.is_running():
+            self.window.stop_all()
+
+    def test_session(self):
+        # every other test times out, the others answer all cards and end with a full report
+        time_out = self.test_sessions % 2 == 1
+        self.test_sessions += 1
+        self.window.start_test()
+        answered = 0
+        while self.window.state == GameState.TESTING and not self.done():
+            if time_out and answered == TIMEOUT_AFTER:
+                self.window.test_timeout()
+            self.answer(self.next_is_wrong())
+            answered += 1
+        if self.window.is_running():
+            self.window.stop_all()
+
+    def run(self):
+        while not self.done():
+            self.practice_session()
+            self.test_session()
+
+    def slowdown(self) -> float:
+        """ p95 latency of the last 10% of answers relative to the first 10%. """
+        tenth = max(1, len(self.latencies) // 10)
+        return percentile(self.latencies[-tenth:], 0.95) / percentile(self.latencies[:tenth], 0.95)
+
+
+@skipUnless(os.environ.get("TAFELS_LOAD"), "load test, set TAFELS_LOAD=1 to run")
+@skipUnless(HAVE_QT, "needs PySide2 and the generated ui module")
+class TestMainWindowLoad(TestCase):
+    app: QApplication
+    config: LoadConfig
+    set_platform: bool
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = LoadConfig()
+        # must be set before the QApplication is created, and is only needed for this test
+        cls.set_platform = "QT_QPA_PLATFORM" not in os.environ
+        if cls.set_platform:
+            os.environ["QT_QPA_PLATFORM"] = "offscreen"
+        cls.app = QApplication.instance() or QApplication([])
+        cls.config.report_file.write_text("")
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.set_platform:
+            del os.environ["QT_QPA_PLATFORM"]
+
+    def setUp(self):
+        self.state_dir = TemporaryDirectory()
+        state_path = Path(self.state_dir.name)
+        self.stats_file = state_path / "cardstate.dat"
+        self.patches = [
+            patch.object(TafelsMainWindow, "get_stats_file", return_value=self.stats_file),
+            patch.object(TafelsMainWindow, "get_selections_file", return_value=state_path / "selections.dat"),
+            # the results dialog is modal, it would block the run; the report itself is still generated
+            patch.object(QMessageBox, "exec", return_value=0),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        self.state_dir.cleanup()
+
+    def run_session(self, history_size: int, sample_memory: bool = False) -> LoadRun:
+        CardStatsLoader.store(self.stats_file, synthetic_history(history_size))
+        window = TafelsMainWindow()
+        try:
+            load_run = LoadRun(window, self.config, sample_memory)
+            load_run.run()
+        finally:
+            window.close()
+            window.deleteLater()
+            QApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+        return load_run
+
+    def report(self, line: str):
+        with open(str(self.config.report_file), "a") as handle:
+            handle.write(line + "\n")
+
+    def test_answer_latency_and_memory(self):
+        config = self.config
+        baseline_p95 = None
+        for history_size in config.history_sizes:
+            with self.subTest(history_size=history_size):
+                # latency is measured without tracing, tracemalloc slows down every allocation
+                timed_run = self.run_session(history_size)
+
+                tracemalloc.start()
+                try:
+                    sampled_run = self.run_session(history_size, sample_memory=True)
+                finally:
+                    tracemalloc.stop()
+                samples = sampled_run.samples
+                self.assertGreaterEqual(len(samples), 2, "need at least two memory samples, lower "
+                                                         "TAFELS_LOAD_SAMPLE_EVERY or raise TAFELS_LOAD_ANSWERS")
+                first, last = samples[0], samples[-1]
+                python_growth_kb = last.python_kb - first.python_kb
+                rss_growth_kb = None
+                if first.rss_kb is not None and last.rss_kb is not None:
+                    rss_growth_kb = last.rss_kb - first.rss_kb
+
+                latencies = timed_run.latencies
+                p95_msec = percentile(latencies, 0.95) * 1000
+                slowdown = timed_run.slowdown()
+                if baseline_p95 is None:
+                    baseline_p95 = p95_msec
+                summary = "history %d: %d answers, median %.3f ms, p95 %.3f ms (x%.2f vs history %d), " \
+                          "max %.3f ms, last/first 10%% p95 x%.2f, " \
+                          "python heap +%.1f KB, rss %s over answers %d-%d" % (
+                              history_size, len(latencies), median(latencies) * 1000, p95_msec,
+                              p95_msec / baseline_p95, config.history_sizes[0], max(latencies) * 1000, slowdown,
+                              python_growth_kb, "n/a" if rss_growth_kb is None else "+%d KB" % rss_growth_kb,
+                              first.answers_given, last.answers_given)
+                self.report(summary)
+
+                self.assertEqual(len(latencies), config.num_answers, summary)
+                self.assertLessEqual(p95_msec, config.answer_budget_msec, summary)
+                self.assertLessEqual(slowdown, config.slowdown_budget, summary)
+                self.assertLessEqual(python_growth_kb, config.memory_budget_kb, summary)
+                if rss_growth_kb is not None:
+                    self.assertLessEqual(rss_growth_kb, config.rss_budget_kb, summary)